@@ -1,13 +1,12 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
-from typing import Optional, Dict
-import os
-from dotenv import load_dotenv
+from typing import Optional
+import asyncio
 
-from core import calculate_route, RouteError
+from contextlib import asynccontextmanager
 
-# Charger les variables d'environnement
-load_dotenv()
+# core charge déjà le .env (load_dotenv) à l'import
+from core import calculate_route, preload, RouteError
 
 tags_metadata = [
     {
@@ -20,6 +19,12 @@ tags_metadata = [
     },
 ]
 
+@asynccontextmanager
+async def lifespan(app):
+    # Préchargement du graphe et du géocodeur inverse : la première requête ne paie pas le chargement
+    await asyncio.to_thread(preload)
+    yield
+
 app = FastAPI(
     title="🇧🇯 Bénin Routing API",
     description="""
@@ -32,6 +37,7 @@ app = FastAPI(
     """,
     version="1.1.0",
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
     contact={
         "name": "Support T-IA",
         "email": "support@t-ia.bj",
@@ -111,7 +117,10 @@ async def get_route(request: RouteRequest):
     is_raining = (request.season.lower() == "rain")
 
     try:
-        result = calculate_route(
+        # Calcul bloquant (géocodage + Dijkstra) déporté dans un thread :
+        # la boucle d'événements continue de servir les autres requêtes.
+        result = await asyncio.to_thread(
+            calculate_route,
             start_input=request.start,
             end_input=request.end,
             avoid_input=request.avoid,
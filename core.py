@@ -1,12 +1,18 @@
 import osmnx as ox
 import networkx as nx
-import heapq
 import sys
-import os
-import reverse_geocoder as rg
 import numpy as np
 import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
 from dotenv import load_dotenv
+import routing
+from routing import load_network, reverse_geocode, get_path_metrics, get_nodes_to_avoid, city_steps
 
 # Charger les variables d'environnement depuis .env
 load_dotenv()
@@ -20,194 +26,139 @@ FON_CITIES = {
     "Bohicon": "Bɔxikɔn",
     "Allada": "Alada"
 }
+FON_CITIES_LOWER = {k.lower(): (k, v) for k, v in FON_CITIES.items()}
 
-def load_graph(place_name="Benin", filename="benin_major.graphml"):
-    """
-    Charge le graphe, assure que les vitesses et temps de trajet sont présents.
-    """
-    # Configuration
-    ox.settings.use_cache = True
-    ox.settings.log_console = False # Moins de bruit
-    ox.settings.requests_timeout = 600
-
-    if os.path.exists(filename):
-        print(f"Chargement des données routières...")
-        try:
-            graph = ox.load_graphml(filename)
-            return graph
-        except Exception:
-            pass # Si échec, on re-télécharge
-    
-    print(f"Téléchargement de la carte routière (Grands Axes) : {place_name}...")
-    try:
-        cf = '["highway"~"motorway|trunk|primary|secondary"]'
-        graph = ox.graph_from_place(place_name, custom_filter=cf, network_type='drive')
-        
-        # Ajouter vitesses et temps (pour calculer le trajet le plus rapide)
-        graph = ox.add_edge_speeds(graph)
-        graph = ox.add_edge_travel_times(graph)
-        
-        ox.save_graphml(graph, filename)
-        return graph
-    except Exception as e:
-        print(f"Erreur chargement graphe : {e}")
-        return None
+# Taille des caches d'itinéraires (quelques couples O-D dominent le trafic)
+ROUTE_CACHE_SIZE = 4096
 
-def reconstruct_path(parent_f, parent_b, meeting_node, total_val):
-    if meeting_node is None:
-        return None, float('inf')
-    
-    # Reconstruct nodes
-    path_f = []
-    curr = meeting_node
-    while curr is not None:
-        path_f.append(curr)
-        curr = parent_f[curr]
-    path_f.reverse()
-    
-    path_b = []
-    curr = parent_b[meeting_node]
-    while curr is not None:
-        path_b.append(curr)
-        curr = parent_b[curr]
-        
-    return path_f + path_b, total_val
+class LRUCache:
+    """Petit cache LRU thread-safe (OrderedDict + verrou)."""
 
-def bidirectional_dijkstra(graph, start_node, end_node, weight='travel_time', avoid_nodes=None):
-    """
-    Dijkstra Bidirectionnel.
-    - weight: 'travel_time' (rapide) ou 'length' (court)
-    - avoid_nodes: set des nœuds à éviter (interdits)
-    """
-    if avoid_nodes is None:
-        avoid_nodes = set()
-        
-    if start_node not in graph or end_node not in graph:
-        return None, float('inf')
-        
-    if start_node in avoid_nodes or end_node in avoid_nodes:
-        # Impossible si départ ou arrivée est dans la zone interdite
-        pass
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
 
-    q_f = [(0, start_node)]
-    q_b = [(0, end_node)]
-    
-    dist_f = {start_node: 0}
-    dist_b = {end_node: 0}
-    
-    parent_f = {start_node: None}
-    parent_b = {end_node: None}
-    
-    visited_f = set()
-    visited_b = set()
-    
-    mu = float('inf')
-    meeting_node = None
-    
-    while q_f and q_b:
-        if q_f[0][0] + q_b[0][0] >= mu:
-            break
-            
-        # --- Forward ---
-        if q_f:
-            d_u, u = heapq.heappop(q_f)
-            if u not in visited_f and u not in avoid_nodes:
-                visited_f.add(u)
-                for v in graph.neighbors(u):
-                    if v in avoid_nodes: continue
-                    
-                    # Récupérer poids
-                    edges = graph.get_edge_data(u, v)
-                    # On prend l'arête qui minimise le critère (temps ou distance)
-                    val = min(d.get(weight, float('inf')) for d in edges.values())
-                    
-                    if d_u + val < dist_f.get(v, float('inf')):
-                        dist_f[v] = d_u + val
-                        parent_f[v] = u
-                        heapq.heappush(q_f, (dist_f[v], v))
-                        
-                        if v in dist_b:
-                            total = dist_f[v] + dist_b[v]
-                            if total < mu:
-                                mu = total
-                                meeting_node = v
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
 
-        # --- Backward ---
-        if q_b:
-            d_v, v = heapq.heappop(q_b)
-            if v not in visited_b and v not in avoid_nodes:
-                visited_b.add(v)
-                for u in graph.predecessors(v):
-                    if u in avoid_nodes: continue
-                    
-                    edges = graph.get_edge_data(u, v)
-                    val = min(d.get(weight, float('inf')) for d in edges.values())
-                    
-                    if d_v + val < dist_b.get(u, float('inf')):
-                        dist_b[u] = d_v + val
-                        parent_b[u] = v
-                        heapq.heappush(q_b, (dist_b[u], u))
-                        
-                        if u in dist_f:
-                            total = dist_f[u] + dist_b[u]
-                            if total < mu:
-                                mu = total
-                                meeting_node = u
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
-    return reconstruct_path(parent_f, parent_b, meeting_node, mu)
+# Réseau routier (vue CSR en mmap), chargé une seule fois par processus
+_CSR = None
+_GRAPH_LOCK = threading.Lock()
 
-def get_path_metrics(graph, path_nodes):
-    """Calcule distance totale (m) et temps total (s) pour un chemin donné."""
-    total_dist = 0.0
-    total_time = 0.0
-    
-    for i in range(len(path_nodes) - 1):
-        u, v = path_nodes[i], path_nodes[i+1]
-        data = graph.get_edge_data(u, v)
-        # On suppose qu'on a pris la meilleure arête. On prend le min travel_time pour être cohérent.
-        edge = min(data.values(), key=lambda x: x.get('travel_time', float('inf')))
-        
-        total_dist += edge.get('length', 0)
-        total_time += edge.get('travel_time', 0)
-        
-    return total_dist, total_time
+def get_graph():
+    """
+    Retourne le réseau CSR, chargé au premier appel puis partagé par toutes les
+    requêtes (verrou à double vérification). Le GraphML n'est parsé que si le
+    cache .npy manque ou est périmé. None si le chargement échoue.
+    """
+    global _CSR
+    if _CSR is None:
+        with _GRAPH_LOCK:
+            if _CSR is None:
+                _CSR = load_network()
+    return _CSR
 
-def get_nodes_to_avoid(graph, city_name, radius_km=5):
-    """Trouve tous les nœuds dans un rayon de X km autour d'une ville."""
-    try:
-        point = ox.geocode(f"{city_name}, Benin")
-        center_node = ox.distance.nearest_nodes(graph, point[1], point[0])
-        
-        avoid_set = set()
-        c_lat, c_lon = point
-        limit_sq = (radius_km / 111.0) ** 2 # Approx degrés (1 deg lat ~= 111km)
-        
-        for n, data in graph.nodes(data=True):
-            dy = data['y'] - c_lat
-            dx = data['x'] - c_lon
-            if dy*dy + dx*dx < limit_sq:
-                avoid_set.add(n)
-                
-        return avoid_set
-    except Exception:
-        return set()
+def preload():
+    """Charge le graphe et le géocodeur inverse (appelé au démarrage de l'API)."""
+    get_graph()
+    reverse_geocode([(0.0, 0.0)])
 
+_ROUTE_CACHE = LRUCache(ROUTE_CACHE_SIZE)
+_PATH_CACHE = LRUCache(ROUTE_CACHE_SIZE)
 
+def cached_shortest_path(csr, start_node, end_node, avoid_mask=None):
+    """
+    Plus court chemin (temps de trajet) mémorisé (LRU) par (départ, arrivée, nœuds évités).
+    Des saisies différentes qui tombent sur les mêmes nœuds réutilisent le calcul.
+    Retourne (chemin en nœuds OSM, positions CSR des arêtes empruntées).
+    """
+    if avoid_mask is not None and not avoid_mask.any():
+        avoid_mask = None
+    # Clé compacte : le masque empaqueté en bits (N/8 octets)
+    avoid_key = np.packbits(avoid_mask).tobytes() if avoid_mask is not None else b''
+    key = (start_node, end_node, avoid_key)
+    hit = _PATH_CACHE.get(key)
+    if hit is None:
+        path, _, edges = routing.bidirectional_dijkstra(csr, start_node, end_node, 'travel_time', avoid_mask)
+        hit = (path, edges)
+        if path:
+            _PATH_CACHE.put(key, hit)
+    return hit
 
 def get_fon_city_name(city_fren):
     # Nettoyage basique pour matcher les clés
     base_name = city_fren.split(',')[0].strip()
-    # Recherche case-insensitive
-    for k, v in FON_CITIES.items():
-        if k.lower() == base_name.lower():
-            return f"{v} ({k})"
+    # Recherche case-insensitive (dict indexé en minuscules : O(1))
+    entry = FON_CITIES_LOWER.get(base_name.lower())
+    if entry:
+        k, v = entry
+        return f"{v} ({k})" # Format demandé : "Kutɔnu (Cotonou)"
     return city_fren
 
+# Cache disque du géocodage (sqlite : sûr entre threads et entre workers)
+GEOCODE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "geocode_cache.sqlite")
+
+def _geocode_db():
+    db = sqlite3.connect(GEOCODE_DB, timeout=10)
+    db.execute("CREATE TABLE IF NOT EXISTS geocode (query TEXT PRIMARY KEY, lat REAL, lon REAL)")
+    return db
+
+@lru_cache(maxsize=10_000)
+def cached_geocode(query):
+    """
+    ox.geocode mémorisé en mémoire (lru_cache) puis sur disque (clé = requête en
+    minuscules) : une ville déjà vue ne repart pas vers Nominatim, même après
+    un redémarrage. Les échecs ne sont pas mémorisés.
+    """
+    key = query.strip().lower()
+    try:
+        with closing(_geocode_db()) as db:
+            row = db.execute("SELECT lat, lon FROM geocode WHERE query = ?", (key,)).fetchone()
+        if row:
+            return row
+    except sqlite3.Error:
+        pass # Cache indisponible : on géocode normalement
+
+    point = ox.geocode(query)
+    try:
+        with closing(_geocode_db()) as db, db:
+            db.execute("INSERT OR REPLACE INTO geocode VALUES (?, ?, ?)", (key, float(point[0]), float(point[1])))
+    except sqlite3.Error:
+        pass
+    return point
+
 def smart_geocode(query):
     try:
-        return ox.geocode(query)
+        return cached_geocode(query)
     except:
-        return ox.geocode(f"{query}, Benin")
+        return cached_geocode(f"{query}, Benin")
+
+@lru_cache(maxsize=4096)
+def _country_code_for_query(query):
+    """
+    Géocodage + pays (rg.search) d'une saisie utilisateur, mémorisés par chaîne :
+    une ville déjà demandée (Cotonou, Porto-Novo...) ne coûte plus ni réseau ni
+    reverse_geocoder. Les échecs ne sont pas mémorisés.
+    Retourne ((lat, lon), code pays, nom de la ville la plus proche).
+    """
+    point = smart_geocode(query)
+    info = reverse_geocode([point])[0]
+    return point, info.get('cc', ''), info.get('name')
+
+# Géocodages d'une requête (départ, arrivée, évitement) lancés en parallèle
+_GEOCODE_POOL = ThreadPoolExecutor(max_workers=8)
 
 class RouteError(Exception):
     def __init__(self, message, details=None):
@@ -216,49 +167,70 @@ class RouteError(Exception):
         super().__init__(self.message)
 
 def calculate_route(start_input, end_input, avoid_input=None, season_raining=False, api_key=None):
+    """
+    Calcule l'itinéraire formaté (JSON) entre deux lieux du Bénin.
+    Les résultats sont mémorisés par (départ, arrivée, évitement, saison) :
+    une requête répétée ne refait ni géocodage ni Dijkstra.
+    """
     # 0. Validation : Origine/Destination identiques
     if start_input.lower() == end_input.lower():
         raise RouteError(f"Origine et destination identiques ({start_input})")
 
+    key = (
+        start_input.lower(),
+        end_input.lower(),
+        avoid_input.lower() if avoid_input else '',
+        bool(season_raining)
+    )
+    result = _ROUTE_CACHE.get(key)
+    if result is None:
+        result, complete = _compute_route(start_input, end_input, avoid_input, season_raining)
+        # Ville à éviter introuvable (géocodage en échec) : trajet calculé sans
+        # évitement, servi tel quel mais jamais mémorisé
+        if complete:
+            _ROUTE_CACHE.put(key, result)
+    # Copie : l'appelant ne doit pas pouvoir modifier l'entrée du cache
+    return dict(result)
+
+def _compute_route(start_input, end_input, avoid_input, season_raining):
+    """
+    Retourne (json_output, complet) ; complet = False si la ville à éviter n'a
+    pas pu être géocodée (évitement ignoré), auquel cas le résultat n'est pas mis en cache.
+    """
     # 1. Chargement
-    G = load_graph()
-    if G is None:
+    csr = get_graph()
+    if csr is None:
         raise RouteError("Impossible de charger le graphe routier")
     
     # 2. Points & Vérification Pays
-    try:
-        start_pt = smart_geocode(start_input)
-        end_pt = smart_geocode(end_input)
-        
-        # Vérification International (Départ ET Arrivée)
-        try:
-            start_geocode_info = rg.search(start_pt)[0]
-            dest_geocode_info = rg.search(end_pt)[0]
-        except Exception:
-             # Fallback if reverse geocoding fails, proceed with caution or error?
-             # For now, let's assume if ox.geocode worked, points are valid coordinates.
-             # But RG is needed for country check.
-             pass
+    # Les trois géocodages (attente réseau) partent en même temps
+    start_future = _GEOCODE_POOL.submit(_country_code_for_query, start_input)
+    end_future = _GEOCODE_POOL.submit(_country_code_for_query, end_input)
+    avoid_future = None
+    if avoid_input:
+        avoid_future = _GEOCODE_POOL.submit(get_nodes_to_avoid, csr, avoid_input, radius_km=3, geocode=cached_geocode)
 
-        start_cc = start_geocode_info.get('cc', '')
-        dest_cc = dest_geocode_info.get('cc', '')
+    try:
+        # Vérification International (Départ ET Arrivée) : pays mémorisé avec le géocodage
+        start_pt, start_cc, start_name = start_future.result()
+        end_pt, dest_cc, dest_name = end_future.result()
         
         # 1. Vérification du DÉPART
         if start_cc != 'BJ':
             raise RouteError(
-                f"Départ incorrect ({start_geocode_info.get('name')}, {start_cc})", 
+                f"Départ incorrect ({start_name}, {start_cc})", 
                 "La zone de couverture est EXCLUSIVEMENT le BÉNIN."
             )
             
         # 2. Vérification de l'ARRIVÉE
         if dest_cc != 'BJ':
              raise RouteError(
-                f"Destination hors zone ({dest_geocode_info.get('name')}, {dest_cc})", 
+                f"Destination hors zone ({dest_name}, {dest_cc})", 
                 "Trajet impossible : Le calculateur ne gère que les routes internes."
             )
         
-        start_node = ox.distance.nearest_nodes(G, start_pt[1], start_pt[0])
-        end_node = ox.distance.nearest_nodes(G, end_pt[1], end_pt[0])
+        # Nœuds les plus proches : KD-tree du CSR (construit une fois, partagé avec l'évitement)
+        start_node, end_node = csr.nearest_nodes([start_pt, end_pt])
         
     except RouteError:
         raise
@@ -266,19 +238,22 @@ def calculate_route(start_input, end_input, avoid_input=None, season_raining=Fal
         raise RouteError("Lieu introuvable", str(e))
         
     # 3. Évitement
-    avoid_nodes = set()
-    if avoid_input:
-        avoid_nodes = get_nodes_to_avoid(G, avoid_input, radius_km=3) 
+    avoid_mask = None
+    if avoid_future is not None:
+        avoid_mask = avoid_future.result()
 
     # 4. Calcul
-    path, _ = bidirectional_dijkstra(G, start_node, end_node, weight='travel_time', avoid_nodes=avoid_nodes)
+    path, path_edges = cached_shortest_path(csr, start_node, end_node, avoid_mask)
     
     if not path:
         raise RouteError("Aucun chemin trouvé")
 
     # --- Calcul des Segments pour le JSON ---
-    coords = [(G.nodes[n]['y'], G.nodes[n]['x']) for n in path]
-    results = rg.search(coords)
+    # Ville la plus proche de chaque nœud : précalculée avec le CSR (aucun rg.search ici)
+    path_idx = np.fromiter((csr.index[n] for n in path), dtype=np.int32, count=len(path))
+    path_city = csr.node_city[path_idx]
+    names = csr.city_names[path_city]
+    ccs = csr.city_cc[path_city]
     
     json_output = {}
     
@@ -286,45 +261,14 @@ def calculate_route(start_input, end_input, avoid_input=None, season_raining=Fal
     real_start_name = start_input.title()
     json_output["departure"] = get_fon_city_name(real_start_name)
     
-    # Calcul des étapes et distances
-    segment_dist = 0.0
-    step_count = 1
-    current_city_name = results[0]['name']
-    
-    # Identification Ville Finale
-    final_city_name = None
-    for res in reversed(results):
-        if res['cc'] == 'BJ':
-            final_city_name = res['name']
-            break
-    if not final_city_name: final_city_name = results[-1]['name']
-
-    for i in range(len(path) - 1):
-        u, v = path[i], path[i+1]
-        
-        data = G.get_edge_data(u, v)
-        edge_len = min(d.get('length', 0) for d in data.values())
-        segment_dist += edge_len
-        
-        next_res = results[i+1]
-        if next_res['cc'] != 'BJ': continue 
-        
-        next_city = next_res['name']
-        
-        if next_city != current_city_name:
-            if next_city == final_city_name:
-                current_city_name = next_city
-            else:
-                km_seg = segment_dist / 1000.0
-                city_fon = get_fon_city_name(next_city)
-                json_output[f"step_{step_count}"] = f"{city_fon} - {km_seg:.1f}km"
-                
-                step_count += 1
-                segment_dist = 0.0
-                current_city_name = next_city
+    # Calcul des étapes et distances (distances cumulées sur les arêtes du chemin)
+    cum_dist = np.concatenate([[0.0], np.cumsum(csr.w_length[path_edges], dtype=np.float64)])
+    steps, km_final = city_steps(names, ccs, cum_dist)
+    for step_count, (city, km_seg) in enumerate(steps, start=1):
+        city_fon = get_fon_city_name(city)
+        json_output[f"step_{step_count}"] = f"{city_fon} - {km_seg:.1f}km"
     
     # Destination
-    km_final = segment_dist / 1000.0
     dest_name_fon = get_fon_city_name(end_input.title())
     json_output["destination"] = f"{dest_name_fon} - {km_final:.1f}km"
     
@@ -339,12 +283,13 @@ def calculate_route(start_input, end_input, avoid_input=None, season_raining=Fal
     json_output["season"] = season_fon
     
     # --- Info Sup ---
-    dist_m, time_s = get_path_metrics(G, path)
+    dist_m, time_s = get_path_metrics(csr, path_edges)
     km_total = dist_m / 1000.0
     
     # Météo
     weather_msg = ""
-    lat_max = max(G.nodes[n]['y'] for n in path)
+    # Latitude max du trajet : une réduction NumPy sur les nœuds du chemin
+    lat_max = float(csr.ys[path_idx].max())
     if season_raining and lat_max > 9.8:
         time_s += 1800 # +30m
         weather_msg = " | [Météo] Ali gblé (+30min)"
@@ -370,4 +315,4 @@ def calculate_route(start_input, end_input, avoid_input=None, season_raining=Fal
     # Traduction Info Sup (Direct)
     json_output["info_sup"] = info_sup_fon
 
-    return json_output
+    return json_output, not avoid_input or avoid_mask is not None
@@ -0,0 +1,77 @@
+import numpy as np
+from numba import njit
+
+# Tas 4-aire min indexé (decrease-key) sur tableaux parallèles :
+# keys (float64) / nodes (int32) + pos[nœud].
+# pos = -1 : jamais vu, -2 : déjà extrait (définitif), >= 0 : position dans le tas.
+# Chaque nœud y figure au plus une fois (taille <= N, pas de doublons périmés).
+# Parent de i : (i - 1) // 4, enfants : 4i + 1 .. 4i + 4. L'arbre est deux fois
+# moins profond qu'un tas binaire et les 4 enfants sont contigus en mémoire.
+
+@njit(cache=True)
+def _sift_up(keys, nodes, pos, i):
+    k = keys[i]
+    v = nodes[i]
+    while i > 0:
+        p = (i - 1) >> 2
+        if keys[p] <= k:
+            break
+        keys[i] = keys[p]
+        nodes[i] = nodes[p]
+        pos[nodes[i]] = i
+        i = p
+    keys[i] = k
+    nodes[i] = v
+    pos[v] = i
+
+@njit(cache=True)
+def _sift_down(keys, nodes, pos, size, i):
+    k = keys[i]
+    v = nodes[i]
+    while True:
+        first = 4 * i + 1
+        if first >= size:
+            break
+        # Plus petit des (au plus) 4 enfants
+        c = first
+        last = min(first + 4, size)
+        for j in range(first + 1, last):
+            if keys[j] < keys[c]:
+                c = j
+        if keys[c] >= k:
+            break
+        keys[i] = keys[c]
+        nodes[i] = nodes[c]
+        pos[nodes[i]] = i
+        i = c
+    keys[i] = k
+    nodes[i] = v
+    pos[v] = i
+
+@njit(cache=True)
+def push(keys, nodes, pos, size, k, v):
+    """Insère v avec la clé k, ou diminue sa clé s'il est déjà dans le tas. Retourne la nouvelle taille."""
+    i = pos[v]
+    if i < 0:
+        i = size
+        size += 1
+        nodes[i] = v
+    keys[i] = k
+    _sift_up(keys, nodes, pos, i)
+    return size
+
+@njit(cache=True)
+def pop(keys, nodes, pos, size):
+    """Retire la racine (à lire dans keys[0]/nodes[0] avant l'appel). Retourne la nouvelle taille."""
+    pos[nodes[0]] = -2
+    size -= 1
+    if size > 0:
+        keys[0] = keys[size]
+        nodes[0] = nodes[size]
+        _sift_down(keys, nodes, pos, size, 0)
+    return size
+
+@njit(cache=True)
+def new_heap(n):
+    """Tableaux (keys, nodes, pos) vides pour un graphe de n nœuds."""
+    return np.empty(n), np.empty(n, dtype=np.int32), np.full(n, -1, dtype=np.int32)
@@ -0,0 +1,804 @@
+import osmnx as ox
+import heapq
+import os
+import tempfile
+import reverse_geocoder as rg
+import numpy as np
+from numba import njit, prange
+from scipy.spatial import cKDTree
+from functools import cached_property
+import heap4
+
+# --- 1. Chargement des données du graphe ---
+
+def load_graph(place_name="Benin", filename="benin_major.graphml"):
+    """
+    Charge le graphe, assure que les vitesses et temps de trajet sont présents.
+    """
+    # Configuration
+    ox.settings.use_cache = True
+    ox.settings.log_console = False # Moins de bruit
+    ox.settings.requests_timeout = 600
+
+    if os.path.exists(filename):
+        print(f"Chargement des données routières...")
+        try:
+            graph = ox.load_graphml(filename)
+            return graph
+        except Exception:
+            pass # Si échec, on re-télécharge
+    
+    print(f"Téléchargement de la carte routière (Grands Axes) : {place_name}...")
+    try:
+        cf = '["highway"~"motorway|trunk|primary|secondary"]'
+        graph = ox.graph_from_place(place_name, custom_filter=cf, network_type='drive')
+        
+        # Ajouter vitesses et temps (pour calculer le trajet le plus rapide)
+        graph = ox.add_edge_speeds(graph)
+        graph = ox.add_edge_travel_times(graph)
+        
+        ox.save_graphml(graph, filename)
+        return graph
+    except Exception as e:
+        print(f"Erreur chargement graphe : {e}")
+        return None
+
+# --- 2. Vue CSR (villes, tableaux compacts, cache .npy) ---
+
+def reverse_geocode(coords):
+    """
+    rg.search sur une liste de (lat, lon), en mode mono-processus (mode=1) :
+    RGeocoder est déjà un singleton (jeu de données et KD-tree chargés une fois
+    par processus) et aucune réserve de processus n'est lancée par requête.
+    """
+    return rg.RGeocoder(mode=1, verbose=False).query([(float(lat), float(lon)) for lat, lon in coords])
+
+def build_city_table(xs, ys):
+    """
+    Ville la plus proche (reverse_geocoder) de chaque nœud, en un seul appel groupé.
+    Retourne node_city (indice dans la table) + la table city_names / city_cc.
+    """
+    results = reverse_geocode(zip(ys.tolist(), xs.tolist()))
+    table = {}
+    node_city = np.empty(len(results), dtype=np.int32)
+    for i, res in enumerate(results):
+        node_city[i] = table.setdefault((res['name'], res['cc']), len(table))
+    return {
+        'node_city': node_city,
+        'city_names': np.array([name for name, _ in table] or [''], dtype=str),
+        'city_cc': np.array([cc for _, cc in table] or [''], dtype=str),
+    }
+
+def build_csr(G):
+    """
+    Compacte le graphe en tableaux CSR (successeurs + prédécesseurs).
+    - Le nœud d'indice i est le i-ème nœud de G.nodes.
+    - Les arêtes parallèles (MultiDiGraph) sont fusionnées une fois pour toutes :
+      w_travel / w_length gardent le minimum de chaque critère pour (u, v).
+    - rev_edge[k] donne la position dans le CSR avant de la k-ième arête inverse.
+    - Indices en int32 et poids en float32 (secondes / mètres) : deux fois moins
+      d'octets lus par relaxation. Seuls les identifiants OSM restent en int64.
+    Retourne un dict de tableaux (cf. CSR_ARRAYS).
+    """
+    index = {n: i for i, n in enumerate(G.nodes)}
+    n = len(index)
+    edges = list(G.edges(data=True))
+    src = np.fromiter((index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+    dst = np.fromiter((index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+    travel = np.fromiter((d.get('travel_time', np.inf) for _, _, d in edges), dtype=np.float64, count=len(edges))
+    length = np.fromiter((d.get('length', np.inf) for _, _, d in edges), dtype=np.float64, count=len(edges))
+
+    # Tri par (u, v) puis réduction min sur chaque groupe d'arêtes parallèles
+    order = np.lexsort((dst, src))
+    src, dst = src[order], dst[order]
+    starts = np.flatnonzero(np.r_[True, (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])])
+    w_travel = np.minimum.reduceat(travel[order], starts)
+    w_length = np.minimum.reduceat(length[order], starts)
+    src, dst = src[starts], dst[starts]
+
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    rev_edge = np.argsort(dst, kind='stable').astype(np.int32)
+    rev_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(dst, minlength=n), out=rev_indptr[1:])
+
+    return {
+        'node_ids': np.fromiter(G.nodes, dtype=np.int64, count=n),
+        'xs': np.fromiter((x for _, x in G.nodes(data='x')), dtype=np.float64, count=n),
+        'ys': np.fromiter((y for _, y in G.nodes(data='y')), dtype=np.float64, count=n),
+        'indptr': indptr,
+        'indices': dst.astype(np.int32),
+        'w_travel': w_travel.astype(np.float32),
+        'w_length': w_length.astype(np.float32),
+        'rev_indptr': rev_indptr,
+        'rev_indices': src[rev_edge].astype(np.int32),
+        'rev_edge': rev_edge,
+    }
+
+# Tableaux persistés en .npy (un fichier par tableau)
+CSR_ARRAYS = (
+    'node_ids', 'xs', 'ys', 'indptr', 'indices', 'w_travel', 'w_length',
+    'rev_indptr', 'rev_indices', 'rev_edge', 'lm_travel', 'lm_length',
+    'node_city', 'city_names', 'city_cc',
+    'ch_up_indptr', 'ch_up_indices', 'ch_up_w', 'ch_up_edge',
+    'ch_down_indptr', 'ch_down_indices', 'ch_down_w', 'ch_down_edge',
+    'ch_first', 'ch_second', 'ch_orig',
+)
+
+# Nombre de repères (landmarks) pour l'heuristique ALT
+NUM_LANDMARKS = 16
+
+# Nœuds réglés au plus par recherche de témoin (CH) : au-delà, on garde le raccourci
+CH_WITNESS_LIMIT = 500
+
+# Rayon terrestre (m) utilisé par OSMnx pour les longueurs d'arêtes
+EARTH_RADIUS_M = 6_371_009
+
+# Types des tableaux lus par les noyaux de recherche. Un cache écrit avec
+# d'autres types (ex. float64/int64) est refusé au chargement, puis reconstruit.
+CSR_DTYPES = {
+    'indptr': np.int32, 'indices': np.int32, 'rev_indptr': np.int32,
+    'rev_indices': np.int32, 'rev_edge': np.int32,
+    'w_travel': np.float32, 'w_length': np.float32,
+    'lm_travel': np.float32, 'lm_length': np.float32,
+    'ch_up_indptr': np.int32, 'ch_up_indices': np.int32, 'ch_up_w': np.float32,
+    'ch_down_indptr': np.int32, 'ch_down_indices': np.int32, 'ch_down_w': np.float32,
+}
+
+class CSRGraph:
+    """Vue compacte du graphe routier, construite une seule fois après le chargement."""
+
+    def __init__(self, arrays):
+        # Les tableaux de prétraitement (villes, ALT, CH) peuvent manquer : None
+        for name in CSR_ARRAYS:
+            setattr(self, name, arrays.get(name))
+        self.index = {n: i for i, n in enumerate(self.node_ids.tolist())}
+        # Poids des arêtes inverses, alignés sur rev_indices
+        self.rev_w_travel = self.w_travel[self.rev_edge]
+        self.rev_w_length = self.w_length[self.rev_edge]
+        # Index spatial construit une fois (rayons d'évitement, nœud le plus proche)
+        self.tree = cKDTree(np.column_stack([self.xs, self.ys]))
+
+    @classmethod
+    def from_graph(cls, G, preprocess=True):
+        """
+        Construit la vue CSR d'un graphe OSMnx.
+        preprocess=False : CSR seul, sans table des villes, repères ALT ni CH
+        (grands graphes ponctuels, ex. la démo France de sauv/).
+        """
+        arrays = build_csr(G)
+        if not preprocess:
+            return cls(arrays)
+        arrays.update(build_city_table(arrays['xs'], arrays['ys']))
+        # Prétraitement ALT (une fois, persisté avec le CSR) pour chaque critère
+        rev_edge = arrays['rev_edge']
+        sources = select_landmarks(arrays['xs'], arrays['ys'])
+        for name, w in (('lm_travel', arrays['w_travel']), ('lm_length', arrays['w_length'])):
+            arrays[name] = build_landmarks(
+                arrays['indptr'], arrays['indices'], w,
+                arrays['rev_indptr'], arrays['rev_indices'], w[rev_edge], sources
+            )
+        # Contraction Hierarchies pour le critère par défaut (temps de trajet)
+        arrays.update(build_ch(arrays['indptr'], arrays['indices'], arrays['w_travel']))
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, directory):
+        """Charge les tableaux en mmap : pas de parsing, pages partagées entre processus."""
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+            for name in CSR_ARRAYS
+        }
+        for name, dtype in CSR_DTYPES.items():
+            if arrays[name].dtype != dtype:
+                raise ValueError(f"{name} : {arrays[name].dtype} au lieu de {np.dtype(dtype)}")
+        return cls(arrays)
+
+    def save(self, directory):
+        """
+        Écrit chaque tableau dans un fichier temporaire puis le met en place par
+        os.replace (atomique). node_ids.npy, le marqueur de fraîcheur lu par
+        load_network, passe en dernier : un worker concurrent ne voit jamais un
+        marqueur récent à côté de tableaux manquants, partiels ou périmés.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(CSR_ARRAYS, key=lambda name: name == 'node_ids'):
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.npy.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, getattr(self, name))
+                os.replace(tmp, os.path.join(directory, f"{name}.npy"))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def nearest_nodes(self, points):
+        """
+        Nœuds OSM les plus proches d'une liste de points (lat, lon), en une seule
+        requête sur le KD-tree (remplace ox.distance.nearest_nodes).
+        """
+        pts = np.array([(lon, lat) for lat, lon in points], dtype=np.float64)
+        _, idx = self.tree.query(pts)
+        return self.node_ids[idx].tolist()
+
+    def geo_potential(self, s, t, weight):
+        """
+        Potentiels A* géographiques (graphe sans repères ALT) :
+        p(v) = (h(v, t) - h(s, v)) / 2, avec h = distance orthodromique (haversine),
+        divisée par la vitesse maximale du réseau pour 'travel_time'.
+        Une arête n'est jamais plus courte que l'orthodromie entre ses extrémités,
+        donc h est admissible et cohérent : l'arrêt du noyau reste exact.
+        """
+        lat, lon, cos_lat = self._radians
+
+        def great_circle(i):
+            a = (np.sin((lat - lat[i]) / 2) ** 2
+                 + cos_lat * cos_lat[i] * np.sin((lon - lon[i]) / 2) ** 2)
+            # Léger rabais : marge sur les arrondis (poids float32)
+            return 2 * EARTH_RADIUS_M * 0.999 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+        h = 0.5 * (great_circle(t) - great_circle(s))
+        if weight == 'length':
+            return h
+        speed = self._max_speed
+        if not np.isfinite(speed) or speed <= 0:
+            return np.zeros_like(h)
+        return h / speed
+
+    @cached_property
+    def _radians(self):
+        """(lat, lon, cos(lat)) des nœuds en radians, calculés au premier appel de geo_potential."""
+        lat = np.radians(self.ys)
+        return lat, np.radians(self.xs), np.cos(lat)
+
+    @cached_property
+    def _max_speed(self):
+        """Vitesse max du réseau (m/s) : aucune arête n'est parcourue plus vite. Calculée une fois."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return float(np.nanmax(np.where(self.w_length > 0, self.w_length / self.w_travel, 0.0)))
+
+    def unpack_shortcuts(self, ch_edges):
+        """Remplace récursivement les raccourcis CH par les positions CSR des arêtes d'origine."""
+        edges = []
+        stack = list(reversed(ch_edges))
+        while stack:
+            e = stack.pop()
+            if self.ch_orig[e] >= 0:
+                edges.append(self.ch_orig[e])
+            else:
+                stack.append(self.ch_second[e])
+                stack.append(self.ch_first[e])
+        return np.array(edges, dtype=np.int64)
+
+    def weights(self, weight):
+        """Poids (avant, inverse) et table ALT pour 'travel_time' (rapide) ou 'length' (court)."""
+        if weight == 'length':
+            w, rev_w, lm = self.w_length, self.rev_w_length, self.lm_length
+        else:
+            w, rev_w, lm = self.w_travel, self.rev_w_travel, self.lm_travel
+        if lm is None:
+            # Sans repère, le noyau ALT est un Dijkstra bidirectionnel classique
+            lm = np.empty((2, 0, len(self.node_ids)), dtype=np.float32)
+        return w, rev_w, lm
+
+def load_network(filename="benin_major.graphml", cache_dir="benin_major_csr"):
+    """
+    Charge le réseau routier sous forme CSR.
+    Les tableaux sont relus en mmap depuis `cache_dir` ; le GraphML (XML) n'est
+    parsé que lors du premier démarrage ou s'il est plus récent que le cache.
+    """
+    marker = os.path.join(cache_dir, "node_ids.npy")
+    if os.path.exists(marker) and (
+        not os.path.exists(filename) or os.path.getmtime(marker) >= os.path.getmtime(filename)
+    ):
+        try:
+            return CSRGraph.load(cache_dir)
+        except Exception:
+            pass # Cache corrompu : on reconstruit
+
+    G = load_graph(filename=filename)
+    if G is None:
+        return None
+    csr = CSRGraph.from_graph(G)
+    try:
+        csr.save(cache_dir)
+    except OSError:
+        pass # Lecture seule : on garde simplement la version en mémoire
+    return csr
+
+# --- 3. Dijkstra Bidirectionnel (noyau Numba, A* ALT) ---
+
+@njit(cache=True)
+def _potential(pot, v, s, t, lm_from, lm_to):
+    """
+    Potentiel ALT moyen p(v) = (π_t(v) - π_s(v)) / 2, calculé à la demande.
+    π_t / π_s sont les bornes inférieures de d(v, t) / d(s, v) tirées des repères
+    (inégalité triangulaire). Retourne inf si v ne peut pas être sur un chemin s -> t.
+    """
+    p = pot[v]
+    if p == p: # déjà calculé (NaN sinon)
+        return p
+    to_t = 0.0
+    from_s = 0.0
+    for l in range(lm_from.shape[0]):
+        a = float(lm_to[l, v]) - float(lm_to[l, t])     # d(v,l) - d(t,l)
+        b = float(lm_from[l, t]) - float(lm_from[l, v]) # d(l,t) - d(l,v)
+        c = float(lm_from[l, v]) - float(lm_from[l, s]) # d(l,v) - d(l,s)
+        d = float(lm_to[l, s]) - float(lm_to[l, v])     # d(s,l) - d(v,l)
+        # Les comparaisons avec NaN (inf - inf) sont fausses : terme ignoré
+        if a > to_t:
+            to_t = a
+        if b > to_t:
+            to_t = b
+        if c > from_s:
+            from_s = c
+        if d > from_s:
+            from_s = d
+    if to_t == np.inf or from_s == np.inf:
+        p = np.inf
+    else:
+        p = 0.5 * (to_t - from_s)
+    pot[v] = p
+    return p
+
+@njit(cache=True)
+def _expand(keys, nodes, pos, size, indptr, indices, w, dist, parent, parent_edge, dist_other,
+            avoid_mask, mu, meeting, pot, sign, s, t, lm_from, lm_to):
+    """
+    Extrait le sommet du tas d'un côté et relâche ses arêtes (CSR avant ou inverse).
+    Clé du tas = distance + sign * potentiel (sign = 1 en avant, -1 en arrière).
+    Retourne (size, mu, meeting) mis à jour.
+    """
+    u = nodes[0]
+    d_u = dist[u]
+    size = heap4.pop(keys, nodes, pos, size)
+    if avoid_mask[u]:
+        return size, mu, meeting
+    for k in range(indptr[u], indptr[u + 1]):
+        v = indices[k]
+        if avoid_mask[v] or pos[v] == -2:
+            continue
+        nd = d_u + w[k]
+        if nd < dist[v]:
+            p = _potential(pot, v, s, t, lm_from, lm_to)
+            if p == np.inf:
+                continue
+            dist[v] = nd
+            parent[v] = u
+            parent_edge[v] = k
+            size = heap4.push(keys, nodes, pos, size, nd + sign * p, v)
+            total = nd + dist_other[v]
+            if total < mu:
+                mu = total
+                meeting = v
+    return size, mu, meeting
+
+@njit(cache=True)
+def bidij(indptr, indices, w, rindptr, rindices, rw, s, t, avoid_mask, lm_from, lm_to, pot):
+    """
+    Noyau Numba du Dijkstra bidirectionnel sur tableaux CSR, guidé par ALT
+    (A*, repères, inégalité triangulaire) avec potentiels moyens : les clés
+    restent cohérentes des deux côtés et l'arrêt top_f + top_b >= mu reste exact.
+    pot : potentiels par nœud ; NaN = calculé à la demande depuis les repères.
+    Un pot déjà rempli (cf. CSRGraph.geo_potential) remplace les repères.
+    Sans repère et avec pot nul, c'est un Dijkstra bidirectionnel classique.
+    Alternance "min-key" : on avance le côté dont le sommet du tas est le plus petit.
+    Retourne (parent_f, parent_b, edge_f, edge_b, meeting, mu) ; meeting = -1 si
+    aucun chemin. edge_f[v] / edge_b[v] : position (CSR avant / inverse) de l'arête
+    par laquelle v a été atteint.
+    """
+    n = indptr.shape[0] - 1
+    dist_f = np.full(n, np.inf)
+    dist_b = np.full(n, np.inf)
+    parent_f = np.full(n, -1, dtype=np.int32)
+    parent_b = np.full(n, -1, dtype=np.int32)
+    edge_f = np.full(n, -1, dtype=np.int32)
+    edge_b = np.full(n, -1, dtype=np.int32)
+
+    if s == t:
+        return parent_f, parent_b, edge_f, edge_b, s, 0.0
+
+    keys_f, nodes_f, pos_f = heap4.new_heap(n)
+    keys_b, nodes_b, pos_b = heap4.new_heap(n)
+
+    dist_f[s] = 0.0
+    dist_b[t] = 0.0
+    p_s = _potential(pot, s, s, t, lm_from, lm_to)
+    p_t = _potential(pot, t, s, t, lm_from, lm_to)
+    if p_s == np.inf or p_t == np.inf:
+        return parent_f, parent_b, edge_f, edge_b, -1, np.inf
+    size_f = heap4.push(keys_f, nodes_f, pos_f, 0, p_s, s)
+    size_b = heap4.push(keys_b, nodes_b, pos_b, 0, -p_t, t)
+
+    mu = np.inf
+    meeting = -1
+
+    while size_f > 0 and size_b > 0:
+        if keys_f[0] + keys_b[0] >= mu:
+            break
+
+        if keys_f[0] <= keys_b[0]:
+            # --- Forward ---
+            size_f, mu, meeting = _expand(
+                keys_f, nodes_f, pos_f, size_f, indptr, indices, w,
+                dist_f, parent_f, edge_f, dist_b, avoid_mask, mu, meeting,
+                pot, 1.0, s, t, lm_from, lm_to
+            )
+        else:
+            # --- Backward ---
+            size_b, mu, meeting = _expand(
+                keys_b, nodes_b, pos_b, size_b, rindptr, rindices, rw,
+                dist_b, parent_b, edge_b, dist_f, avoid_mask, mu, meeting,
+                pot, -1.0, s, t, lm_from, lm_to
+            )
+
+    return parent_f, parent_b, edge_f, edge_b, meeting, mu
+
+# --- 4. Repères ALT (prétraitement) ---
+
+@njit(cache=True)
+def dijkstra_sssp(indptr, indices, w, source, out):
+    """Dijkstra mono-source : écrit dans `out` la distance de `source` à chaque nœud."""
+    n = indptr.shape[0] - 1
+    keys, nodes, pos = heap4.new_heap(n)
+    out[:] = np.inf
+    out[source] = 0.0
+    size = heap4.push(keys, nodes, pos, 0, 0.0, source)
+    while size > 0:
+        d_u = keys[0]
+        u = nodes[0]
+        size = heap4.pop(keys, nodes, pos, size)
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            if pos[v] == -2:
+                continue
+            nd = d_u + w[k]
+            if nd < out[v]:
+                out[v] = nd
+                size = heap4.push(keys, nodes, pos, size, nd, v)
+
+def select_landmarks(xs, ys, count=NUM_LANDMARKS):
+    """
+    Choisit `count` repères par l'heuristique du point le plus éloigné, sur les
+    coordonnées : le choix ne dépend d'aucun Dijkstra, les calculs de distances
+    peuvent donc ensuite tourner en parallèle.
+    """
+    pts = np.column_stack([xs, ys])
+    count = min(count, len(pts))
+    # Premier repère : le nœud le plus éloigné du centre du réseau
+    current = int(np.argmax(((pts - pts.mean(axis=0)) ** 2).sum(axis=1)))
+    closest = np.full(len(pts), np.inf)
+    sources = np.empty(count, dtype=np.int32)
+    for i in range(count):
+        sources[i] = current
+        closest = np.minimum(closest, ((pts - pts[current]) ** 2).sum(axis=1))
+        current = int(np.argmax(closest))
+    return sources
+
+@njit(parallel=True, cache=True)
+def landmark_distances(indptr, indices, w, sources):
+    """Un Dijkstra mono-source par repère, répartis sur tous les cœurs."""
+    n = indptr.shape[0] - 1
+    out = np.empty((sources.shape[0], n), dtype=np.float32)
+    for i in prange(sources.shape[0]):
+        dist = np.empty(n)
+        dijkstra_sssp(indptr, indices, w, sources[i], dist)
+        out[i] = dist
+    return out
+
+def build_landmarks(indptr, indices, w, rev_indptr, rev_indices, rev_w, sources):
+    """
+    Précalcule les distances des repères `sources`. Retourne un tableau float32
+    (2, count, N) : [0] = d(repère -> v), [1] = d(v -> repère).
+    """
+    return np.stack([
+        landmark_distances(indptr, indices, w, sources),
+        landmark_distances(rev_indptr, rev_indices, rev_w, sources),
+    ])
+
+# --- 5. Contraction Hierarchies (critère 'travel_time', sans évitement) ---
+
+def _witness_search(out, weight, u, skip, limit, max_settled):
+    """Dijkstra local depuis u dans le graphe restant, sans passer par `skip`, borné par `limit`."""
+    dist = {u: 0.0}
+    heap = [(0.0, u)]
+    settled = 0
+    while heap and settled < max_settled:
+        d, x = heapq.heappop(heap)
+        if d > dist[x]:
+            continue
+        if d > limit:
+            break
+        settled += 1
+        for y, e in out[x].items():
+            if y == skip:
+                continue
+            nd = d + weight[e]
+            if nd < dist.get(y, np.inf):
+                dist[y] = nd
+                heapq.heappush(heap, (nd, y))
+    return dist
+
+def build_ch(indptr, indices, w, max_settled=CH_WITNESS_LIMIT):
+    """
+    Prétraitement Contraction Hierarchies sur le CSR (poids w).
+    Les nœuds sont contractés par priorité croissante (différence d'arêtes +
+    voisins déjà supprimés, mise à jour paresseuse). Contracter v ajoute un
+    raccourci u -> x (poids w(u,v) + w(v,x)) sauf si une recherche de témoin
+    trouve un chemin au moins aussi court qui évite v.
+    Retourne les tableaux ch_* (cf. CSR_ARRAYS) :
+    - ch_up_* : CSR des arêtes montantes u -> x (rang(x) > rang(u)), recherche avant ;
+    - ch_down_* : arêtes descendantes u -> x indexées par x (rang(u) > rang(x)), recherche arrière ;
+    - ch_first / ch_second : les deux arêtes remplacées par un raccourci (-1 sinon) ;
+    - ch_orig : position CSR d'une arête d'origine (-1 pour un raccourci).
+    """
+    n = indptr.shape[0] - 1
+    tail, head, weight, first, second, orig = [], [], [], [], [], []
+    out = [{} for _ in range(n)] # graphe restant : out[u][x] = id d'arête
+    inc = [{} for _ in range(n)]
+    best = {}                    # (u, x) -> id de la meilleure arête
+
+    def add_edge(u, x, wt, e1, e2, k):
+        e = len(tail)
+        tail.append(u); head.append(x); weight.append(wt)
+        first.append(e1); second.append(e2); orig.append(k)
+        out[u][x] = inc[x][u] = best[(u, x)] = e
+
+    for u in range(n):
+        for k in range(indptr[u], indptr[u + 1]):
+            x = int(indices[k])
+            if x != u:
+                add_edge(u, x, float(w[k]), -1, -1, k)
+
+    def shortcuts(v):
+        needed = []
+        for u, e1 in inc[v].items():
+            cand = {x: (weight[e1] + weight[e2], e2) for x, e2 in out[v].items() if x != u}
+            if not cand:
+                continue
+            dist = _witness_search(out, weight, u, v, max(c for c, _ in cand.values()), max_settled)
+            for x, (c, e2) in cand.items():
+                if dist.get(x, np.inf) > c:
+                    needed.append((u, x, c, e1, e2))
+        return needed
+
+    deleted = [0] * n
+    def priority(v):
+        return len(shortcuts(v)) - len(inc[v]) - len(out[v]) + deleted[v]
+
+    rank = np.empty(n, dtype=np.int32)
+    queue = [(priority(v), v) for v in range(n)]
+    heapq.heapify(queue)
+    order = 0
+    while queue:
+        _, v = heapq.heappop(queue)
+        p = priority(v)
+        if queue and p > queue[0][0]:
+            heapq.heappush(queue, (p, v))
+            continue
+        for u, x, c, e1, e2 in shortcuts(v):
+            e = out[u].get(x)
+            if e is None or weight[e] > c:
+                add_edge(u, x, c, e1, e2, -1)
+        rank[v] = order
+        order += 1
+        for u in inc[v]:
+            del out[u][v]
+            deleted[u] += 1
+        for x in out[v]:
+            del inc[x][v]
+            deleted[x] += 1
+        out[v], inc[v] = {}, {}
+
+    edges = np.fromiter(best.values(), dtype=np.int32, count=len(best))
+    tail, head = np.array(tail, dtype=np.int32), np.array(head, dtype=np.int32)
+    weight = np.array(weight, dtype=np.float32)
+    up = edges[rank[tail[edges]] < rank[head[edges]]]
+    down = edges[rank[tail[edges]] > rank[head[edges]]]
+    up = up[np.argsort(tail[up], kind='stable')]
+    down = down[np.argsort(head[down], kind='stable')]
+    up_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(tail[up], minlength=n), out=up_indptr[1:])
+    down_indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(head[down], minlength=n), out=down_indptr[1:])
+
+    return {
+        'ch_up_indptr': up_indptr,
+        'ch_up_indices': head[up],
+        'ch_up_w': weight[up],
+        'ch_up_edge': up,
+        'ch_down_indptr': down_indptr,
+        'ch_down_indices': tail[down],
+        'ch_down_w': weight[down],
+        'ch_down_edge': down,
+        'ch_first': np.array(first, dtype=np.int32),
+        'ch_second': np.array(second, dtype=np.int32),
+        'ch_orig': np.array(orig, dtype=np.int32),
+    }
+
+@njit(cache=True)
+def ch_query(up_indptr, up_indices, up_w, down_indptr, down_indices, down_w, s, t):
+    """
+    Requête CH : Dijkstra bidirectionnel qui ne relâche que les arêtes montantes
+    (avant) / descendantes (arrière). Contrairement au Dijkstra classique, chaque
+    côté continue tant que le sommet de son tas est < mu.
+    Même format de retour que bidij (edge_f / edge_b : positions dans ch_up / ch_down).
+    """
+    n = up_indptr.shape[0] - 1
+    dist_f = np.full(n, np.inf)
+    dist_b = np.full(n, np.inf)
+    parent_f = np.full(n, -1, dtype=np.int32)
+    parent_b = np.full(n, -1, dtype=np.int32)
+    edge_f = np.full(n, -1, dtype=np.int32)
+    edge_b = np.full(n, -1, dtype=np.int32)
+
+    if s == t:
+        return parent_f, parent_b, edge_f, edge_b, s, 0.0
+
+    keys_f, nodes_f, pos_f = heap4.new_heap(n)
+    keys_b, nodes_b, pos_b = heap4.new_heap(n)
+    # Pas de repères : potentiel nul (déjà "calculé"), aucun nœud interdit
+    pot = np.zeros(n)
+    no_lm = np.empty((0, n), dtype=np.float32)
+    no_avoid = np.zeros(n, dtype=np.bool_)
+
+    dist_f[s] = 0.0
+    dist_b[t] = 0.0
+    size_f = heap4.push(keys_f, nodes_f, pos_f, 0, 0.0, s)
+    size_b = heap4.push(keys_b, nodes_b, pos_b, 0, 0.0, t)
+
+    mu = np.inf
+    meeting = -1
+
+    while True:
+        top_f = keys_f[0] if size_f > 0 else np.inf
+        top_b = keys_b[0] if size_b > 0 else np.inf
+        if top_f >= mu and top_b >= mu:
+            break
+
+        if top_f <= top_b:
+            size_f, mu, meeting = _expand(
+                keys_f, nodes_f, pos_f, size_f, up_indptr, up_indices, up_w,
+                dist_f, parent_f, edge_f, dist_b, no_avoid, mu, meeting,
+                pot, 1.0, s, t, no_lm, no_lm
+            )
+        else:
+            size_b, mu, meeting = _expand(
+                keys_b, nodes_b, pos_b, size_b, down_indptr, down_indices, down_w,
+                dist_b, parent_b, edge_b, dist_f, no_avoid, mu, meeting,
+                pot, -1.0, s, t, no_lm, no_lm
+            )
+
+    return parent_f, parent_b, edge_f, edge_b, meeting, mu
+
+# --- 6. Recherche d'itinéraire (CH, sinon ALT / A* géographique) ---
+
+def bidirectional_dijkstra(csr, start_node, end_node, weight='travel_time', avoid_mask=None):
+    """
+    Dijkstra Bidirectionnel.
+    - weight: 'travel_time' (rapide) ou 'length' (court)
+    - avoid_mask: masque booléen des nœuds à éviter (interdits), cf. get_nodes_to_avoid
+    Retourne (chemin en nœuds OSM, coût, positions CSR des arêtes empruntées).
+    """
+    if start_node not in csr.index or end_node not in csr.index:
+        return None, float('inf'), None
+
+    s, t = csr.index[start_node], csr.index[end_node]
+    use_ch = csr.ch_up_indptr is not None and weight != 'length'
+    if use_ch and (avoid_mask is None or not avoid_mask.any()):
+        # Cas courant (plus rapide, sans évitement) : requête CH
+        parent_f, parent_b, edge_f, edge_b, meeting, mu = ch_query(
+            csr.ch_up_indptr, csr.ch_up_indices, csr.ch_up_w,
+            csr.ch_down_indptr, csr.ch_down_indices, csr.ch_down_w, s, t
+        )
+        path, edges_f, edges_b, total = reconstruct_path(parent_f, parent_b, edge_f, edge_b, meeting, mu)
+        if path is None:
+            return None, total, None
+        edges = csr.unpack_shortcuts(np.concatenate([
+            csr.ch_up_edge[np.asarray(edges_f, dtype=np.int64)],
+            csr.ch_down_edge[np.asarray(edges_b, dtype=np.int64)],
+        ]).tolist())
+        path = [s] + csr.indices[edges].tolist()
+        return csr.node_ids[path].tolist(), float(csr.w_travel[edges].sum(dtype=np.float64)), edges
+
+    # Évitement (le masque change à chaque requête) ou critère 'length' : ALT
+    if avoid_mask is None:
+        avoid_mask = np.zeros(len(csr.node_ids), dtype=np.bool_)
+
+    w, rev_w, lm = csr.weights(weight)
+    if lm.shape[1] > 0:
+        pot = np.full(len(csr.node_ids), np.nan) # ALT : potentiels à la demande
+    else:
+        pot = csr.geo_potential(s, t, weight)    # Sans repères : A* géographique
+    parent_f, parent_b, edge_f, edge_b, meeting, mu = bidij(
+        csr.indptr, csr.indices, w,
+        csr.rev_indptr, csr.rev_indices, rev_w,
+        s, t, avoid_mask,
+        lm[0], lm[1], pot
+    )
+    path, edges_f, edges_b, total = reconstruct_path(parent_f, parent_b, edge_f, edge_b, meeting, mu)
+    if path is None:
+        return None, total, None
+    # Les arêtes du côté arrière sont des positions du CSR inverse
+    edges = np.concatenate([
+        np.asarray(edges_f, dtype=np.int64),
+        csr.rev_edge[np.asarray(edges_b, dtype=np.int64)],
+    ])
+    return csr.node_ids[path].tolist(), total, edges
+
+def reconstruct_path(parent_f, parent_b, edge_f, edge_b, meeting_node, total_val):
+    if meeting_node < 0:
+        return None, None, None, float('inf')
+    
+    # Reconstruct nodes (-1 = pas de parent) et arêtes empruntées
+    path_f = []
+    edges_f = []
+    curr = meeting_node
+    while curr >= 0:
+        path_f.append(curr)
+        if parent_f[curr] >= 0:
+            edges_f.append(edge_f[curr])
+        curr = parent_f[curr]
+    path_f.reverse()
+    edges_f.reverse()
+    
+    path_b = []
+    edges_b = []
+    curr = meeting_node
+    while parent_b[curr] >= 0:
+        edges_b.append(edge_b[curr])
+        curr = parent_b[curr]
+        path_b.append(curr)
+        
+    return path_f + path_b, edges_f, edges_b, float(total_val)
+
+# --- 7. Exploitation du chemin (métriques, évitement, étapes) ---
+
+def get_path_metrics(csr, path_edges):
+    """Calcule distance totale (m) et temps total (s) à partir des arêtes empruntées."""
+    return (float(csr.w_length[path_edges].sum(dtype=np.float64)),
+            float(csr.w_travel[path_edges].sum(dtype=np.float64)))
+
+def get_nodes_to_avoid(csr, city_name, radius_km=5, geocode=None):
+    """
+    Trouve tous les nœuds dans un rayon de X km autour d'une ville.
+    Retourne directement le masque booléen (indexé par nœud CSR) attendu par
+    bidirectional_dijkstra, ou None si la ville est introuvable.
+    - geocode: fonction (requête -> (lat, lon)), ox.geocode par défaut
+      (core passe son cache de géocodage)
+    """
+    try:
+        point = (geocode or ox.geocode)(f"{city_name}, Benin")
+    except Exception:
+        return None
+
+    c_lat, c_lon = point
+    radius = radius_km / 111.0 # Approx degrés (1 deg lat ~= 111km)
+    
+    # Requête de rayon sur le KD-tree du CSR (construit une fois au chargement)
+    avoid_mask = np.zeros(len(csr.node_ids), dtype=np.bool_)
+    avoid_mask[csr.tree.query_ball_point([c_lon, c_lat], r=radius)] = True
+    return avoid_mask
+
+def city_steps(names, ccs, cum_dist):
+    """
+    Découpe le chemin en étapes par ville traversée.
+    - names / ccs: ville et pays de chaque nœud du chemin
+    - cum_dist: distance cumulée (m) jusqu'à chaque nœud (cum_dist[0] = 0)
+    On change de ville à chaque nœud béninois dont la ville diffère de la
+    précédente ; une étape est émise à chaque changement, sauf vers la ville
+    finale (qui clôt le trajet). Retourne ([(ville, km depuis l'étape précédente)], km restants).
+    """
+    bj = np.flatnonzero(ccs[1:] == 'BJ') + 1
+    # Ville courante avant chaque nœud béninois : celle du nœud béninois précédent
+    seq = np.concatenate([names[:1], names[bj]])
+    changes = bj[seq[1:] != seq[:-1]]
+
+    # Ville finale : celle du dernier nœud béninois du chemin
+    in_bj = np.flatnonzero(ccs == 'BJ')
+    final_city = names[in_bj[-1]] if len(in_bj) else names[-1]
+    stops = changes[names[changes] != final_city]
+
+    marks = np.concatenate([[0.0], cum_dist[stops]])
+    steps = list(zip(names[stops].tolist(), (np.diff(marks) / 1000.0).tolist()))
+    return steps, (cum_dist[-1] - marks[-1]) / 1000.0
@@ -0,0 +1,183 @@
+import os
+import random
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+import pytest
+
+import heap4
+import routing
+
+GRAPHML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benin_major.graphml")
+
+# Poids float32 dans le CSR : petites différences d'arrondi avec NetworkX (float64)
+REL_TOL = 1e-5
+ABS_TOL = 1e-3
+
+
+@pytest.fixture(scope="module")
+def graph():
+    return ox.load_graphml(GRAPHML)
+
+
+@pytest.fixture(scope="module")
+def csr(graph):
+    """CSR complet (villes, repères ALT, CH), construit depuis le GraphML."""
+    return routing.CSRGraph.from_graph(graph)
+
+
+@pytest.fixture(scope="module")
+def csr_plain(graph):
+    """CSR sans prétraitement : recherche guidée par l'A* géographique."""
+    return routing.CSRGraph.from_graph(graph, preprocess=False)
+
+
+@pytest.fixture(scope="module")
+def reference(graph):
+    """DiGraph de référence : arêtes parallèles fusionnées au minimum de chaque poids."""
+    D = nx.DiGraph()
+    D.add_nodes_from(graph.nodes)
+    for u, v, d in graph.edges(data=True):
+        old = D.get_edge_data(u, v)
+        tt, ln = d.get('travel_time', np.inf), d.get('length', np.inf)
+        if old is None:
+            D.add_edge(u, v, travel_time=tt, length=ln)
+        else:
+            old['travel_time'] = min(old['travel_time'], tt)
+            old['length'] = min(old['length'], ln)
+    return D
+
+
+def random_pairs(csr, count, seed):
+    rnd = random.Random(seed)
+    nodes = csr.node_ids.tolist()
+    pairs = []
+    while len(pairs) < count:
+        s, t = rnd.choice(nodes), rnd.choice(nodes)
+        if s != t:
+            pairs.append((s, t))
+    return pairs
+
+
+def reference_cost(D, s, t, weight):
+    try:
+        return nx.shortest_path_length(D, s, t, weight=weight)
+    except nx.NetworkXNoPath:
+        return None
+
+
+def check_route(csr, D, s, t, weight, avoid_mask=None):
+    """Compare une recherche à NetworkX et vérifie que les arêtes renvoyées forment le chemin s -> t."""
+    path, total, edges = routing.bidirectional_dijkstra(csr, s, t, weight, avoid_mask)
+    expected = reference_cost(D, s, t, weight)
+    if expected is None:
+        assert path is None
+        return
+    assert path is not None, (s, t)
+    assert total == pytest.approx(expected, rel=REL_TOL, abs=ABS_TOL), (s, t)
+
+    w = csr.w_length if weight == 'length' else csr.w_travel
+    tail = np.repeat(np.arange(len(csr.node_ids)), np.diff(csr.indptr))
+    idx = [csr.index[n] for n in path]
+    assert len(edges) == len(path) - 1
+    assert idx[0] == csr.index[s] and idx[-1] == csr.index[t]
+    assert (tail[edges] == idx[:-1]).all() and (csr.indices[edges] == idx[1:]).all()
+    assert float(w[edges].sum(dtype=np.float64)) == pytest.approx(total, rel=REL_TOL, abs=ABS_TOL)
+    if avoid_mask is not None:
+        assert not avoid_mask[idx].any()
+
+
+def test_ch_travel_time(csr, reference):
+    assert csr.ch_up_indptr is not None
+    for s, t in random_pairs(csr, 300, seed=1):
+        check_route(csr, reference, s, t, 'travel_time')
+
+
+def test_alt_length(csr, reference):
+    assert csr.lm_length is not None
+    for s, t in random_pairs(csr, 300, seed=2):
+        check_route(csr, reference, s, t, 'length')
+
+
+def test_avoid_mask(csr, reference):
+    rnd = random.Random(3)
+    for _ in range(20):
+        center = rnd.randrange(len(csr.node_ids))
+        radius = rnd.uniform(0.05, 0.3)
+        avoid_mask = np.zeros(len(csr.node_ids), dtype=np.bool_)
+        avoid_mask[csr.tree.query_ball_point([csr.xs[center], csr.ys[center]], r=radius)] = True
+        kept = csr.node_ids[~avoid_mask].tolist()
+        D = reference.subgraph(kept)
+        for _ in range(10):
+            s, t = rnd.sample(kept, 2)
+            for weight in ('travel_time', 'length'):
+                check_route(csr, D, s, t, weight, avoid_mask)
+
+
+def test_geo_potential(csr_plain, reference):
+    assert csr_plain.lm_travel is None and csr_plain.ch_up_indptr is None
+    for s, t in random_pairs(csr_plain, 150, seed=4):
+        check_route(csr_plain, reference, s, t, 'travel_time')
+        check_route(csr_plain, reference, s, t, 'length')
+
+
+def test_heap4_decrease_key():
+    rnd = np.random.default_rng(5)
+    n = 500
+    keys, nodes, pos = heap4.new_heap(n)
+    best = np.full(n, np.inf)
+    size = 0
+    for v, k in zip(rnd.integers(0, n, 3000), rnd.random(3000)):
+        if k < best[v]:
+            best[v] = k
+            size = heap4.push(keys, nodes, pos, size, k, v)
+    assert size == np.isfinite(best).sum()
+    popped = []
+    while size:
+        assert keys[0] == best[nodes[0]]
+        popped.append(keys[0])
+        size = heap4.pop(keys, nodes, pos, size)
+    assert popped == sorted(popped)
+    assert (pos[np.isfinite(best)] == -2).all()
+
+
+def reference_city_steps(names, ccs, edge_lengths):
+    """Boucle d'origine (un nœud à la fois) remplacée par routing.city_steps."""
+    final_city = None
+    for name, cc in zip(reversed(names), reversed(ccs)):
+        if cc == 'BJ':
+            final_city = name
+            break
+    if not final_city:
+        final_city = names[-1]
+
+    steps = []
+    segment_dist = 0.0
+    current = names[0]
+    for i in range(len(names) - 1):
+        segment_dist += edge_lengths[i]
+        if ccs[i + 1] != 'BJ':
+            continue
+        nxt = names[i + 1]
+        if nxt != current:
+            if nxt != final_city:
+                steps.append((nxt, segment_dist / 1000.0))
+                segment_dist = 0.0
+            current = nxt
+    return steps, segment_dist / 1000.0
+
+
+def test_city_steps():
+    rnd = random.Random(6)
+    for _ in range(5000):
+        n = rnd.randint(1, 30)
+        names = [rnd.choice("ABCD") for _ in range(n)]
+        ccs = [rnd.choice(("BJ", "BJ", "BJ", "TG")) for _ in range(n)]
+        lengths = [rnd.uniform(0, 5000) for _ in range(n - 1)]
+        cum_dist = np.concatenate([[0.0], np.cumsum(lengths)])
+        steps, km_final = routing.city_steps(np.array(names), np.array(ccs), cum_dist)
+        ref_steps, ref_final = reference_city_steps(names, ccs, lengths)
+        assert [c for c, _ in steps] == [c for c, _ in ref_steps]
+        assert [km for _, km in steps] == pytest.approx([km for _, km in ref_steps])
+        assert km_final == pytest.approx(ref_final)